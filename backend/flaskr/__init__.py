@@ -5,6 +5,7 @@ from flask_cors import CORS
 import random
 
 from models import setup_db, Question, Category
+from .profiling import setup_profiling
 
 '''
 Constant: Number of elements showed in the page.
@@ -61,7 +62,10 @@ def create_app(test_config=None):
 
     # create and configure the app
     app = Flask(__name__)
+    if test_config:
+        app.config.update(test_config)
     setup_db(app)
+    setup_profiling(app)
 
     # 1.- Set up CORS allowing all the origins
     CORS(app, resources={r"/api/*": {"origins": "*"}})
@@ -0,0 +1,129 @@
+import os
+import re
+import hmac
+import random
+import time
+import uuid
+import cProfile
+
+from flask import request, g
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+'''
+Profiling configuration (app config, defaulting to environment variables):
+
+    PROFILE_DIR:         Directory where the '.prof' files are written. When
+                         it is not set, profiling is disabled and no hook is
+                         registered at all.
+    PROFILE_SAMPLE_RATE: Fraction of requests (0.0 - 1.0) profiled at random
+                         (default = 0.0).
+    PROFILE_TOKEN:       Secret that allows a client to force profiling of a
+                         single request by sending it in the PROFILE_HEADER.
+                         Without a token the header is ignored.
+    PROFILE_HEADER:      Request header carrying the token
+                         (default = 'X-Profile').
+'''
+PROFILE_DIR = os.getenv('PROFILE_DIR')
+PROFILE_SAMPLE_RATE = os.getenv('PROFILE_SAMPLE_RATE', '0.0')
+PROFILE_TOKEN = os.getenv('PROFILE_TOKEN')
+PROFILE_HEADER = os.getenv('PROFILE_HEADER', 'X-Profile')
+
+
+'''
+count_query(...)
+    counts the SQL statements executed while a profiled request is running.
+    It is attached once to the 'Engine' class, shared by all the apps.
+'''
+
+
+def count_query(conn, cursor, statement, parameters, context, many):
+    if g and 'profiler' in g:
+        g.query_count += 1
+
+
+'''
+route_tag()
+    builds the file name tag of the current request from its method and URL
+    rule, e.g. 'GET /questions/<int:question_id>' becomes
+    'GET_questions_int_question_id'. Requests not matching any rule (404)
+    are tagged as 'unmatched'.
+'''
+
+
+def route_tag():
+    if request.url_rule is None:
+        return '{}_unmatched'.format(request.method)
+    rule = re.sub(r'[^A-Za-z0-9]+', '_', request.url_rule.rule).strip('_')
+    return '{}_{}'.format(request.method, rule or 'root')
+
+
+'''
+setup_profiling(app)
+    runs the selected requests under cProfile and dumps the pstats output to
+    '<PROFILE_DIR>/<route>.q<query count>.<timestamp>.<pid>.<id>.prof'.
+    The files can be read with 'pstats' or turned into a flamegraph
+    (e.g. snakeviz, flameprof). Calling it more than once is a no-op.
+'''
+
+
+def setup_profiling(app):
+    profile_dir = app.config.get('PROFILE_DIR', PROFILE_DIR)
+    # Disabled >>>> Nothing is attached, so there is no per-request overhead
+    if not profile_dir or 'profiling' in app.extensions:
+        return
+
+    try:
+        sample_rate = float(
+            app.config.get('PROFILE_SAMPLE_RATE', PROFILE_SAMPLE_RATE))
+    except (TypeError, ValueError):
+        sample_rate = None
+    if sample_rate is None or not 0.0 <= sample_rate <= 1.0:
+        raise ValueError(
+            'PROFILE_SAMPLE_RATE must be a number between 0.0 and 1.0')
+
+    token = app.config.get('PROFILE_TOKEN', PROFILE_TOKEN)
+    header = app.config.get('PROFILE_HEADER', PROFILE_HEADER)
+
+    os.makedirs(profile_dir, exist_ok=True)
+    app.extensions['profiling'] = profile_dir
+
+    if not event.contains(Engine, 'before_cursor_execute', count_query):
+        event.listen(Engine, 'before_cursor_execute', count_query)
+
+    def requested():
+        value = request.headers.get(header)
+        return bool(token and value and hmac.compare_digest(
+            value.encode('utf-8'), token.encode('utf-8')))
+
+    @app.before_request
+    def start_profiler():
+        if not (requested() or (
+                sample_rate and random.random() < sample_rate)):
+            return
+
+        g.query_count = 0
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+    @app.after_request
+    def stop_profiler(response):
+        profiler = g.pop('profiler', None)
+        if profiler is None:
+            return response
+
+        profiler.disable()
+        file_name = '{}.q{}.{}.{}.{}.prof'.format(
+            route_tag(), g.query_count, int(time.time() * 1000),
+            os.getpid(), uuid.uuid4().hex[:8])
+        profiler.dump_stats(os.path.join(profile_dir, file_name))
+        response.headers['X-Profile-Queries'] = str(g.query_count)
+        return response
+
+    # Unhandled exceptions skip 'after_request'; keep the profiler from
+    # leaking into the next request on this thread.
+    @app.teardown_request
+    def discard_profiler(exception):
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.disable()
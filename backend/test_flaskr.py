@@ -1,9 +1,13 @@
 import os
 import unittest
 import json
+import tempfile
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 
 from flaskr import create_app
+from flaskr.profiling import count_query
 from models import setup_db, Question, Category
 
 
@@ -78,6 +82,76 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['success'], True)
         self.assertTrue(data['total_questions'])
 
+    def create_profiled_app(self, profile_config):
+        '''Create an app with profiling bound to the test database'''
+        if not event.contains(Engine, 'before_cursor_execute', count_query):
+            self.addCleanup(
+                event.remove, Engine, 'before_cursor_execute', count_query)
+
+        app = create_app(profile_config)
+        setup_db(app, self.DB_PATH)
+        return app
+
+    def test_profile_questions(self):
+        '''Profile a request to the questions endpoint using the token'''
+        with tempfile.TemporaryDirectory() as profile_dir:
+            app = self.create_profiled_app({
+                'PROFILE_DIR': profile_dir,
+                'PROFILE_TOKEN': 'secret'})
+
+            # Without the token nothing is profiled
+            res = app.test_client().get(
+                '/questions', headers={'X-Profile': '1'})
+            self.assertEqual(res.status_code, 200)
+            self.assertEqual(os.listdir(profile_dir), [])
+
+            res = app.test_client().get(
+                '/questions', headers={'X-Profile': 'secret'})
+            files = os.listdir(profile_dir)
+
+            self.assertEqual(res.status_code, 200)
+            self.assertTrue(int(res.headers['X-Profile-Queries']))
+            self.assertEqual(len(files), 1)
+            self.assertTrue(files[0].startswith(
+                'GET_questions.q{}.'.format(
+                    res.headers['X-Profile-Queries'])))
+
+    def test_profile_sampled_questions(self):
+        '''Profile every request when the sample rate is 1.0'''
+        with tempfile.TemporaryDirectory() as profile_dir:
+            app = self.create_profiled_app({
+                'PROFILE_DIR': profile_dir,
+                'PROFILE_SAMPLE_RATE': 1.0})
+
+            res = app.test_client().get('/questions')
+            files = os.listdir(profile_dir)
+
+            self.assertEqual(res.status_code, 200)
+            self.assertEqual(len(files), 1)
+            self.assertTrue(files[0].startswith('GET_questions.q'))
+
+    def test_profile_disabled(self):
+        '''Without PROFILE_DIR nothing is profiled, even with the token'''
+        app = self.create_profiled_app({
+            'PROFILE_DIR': None,
+            'PROFILE_SAMPLE_RATE': 1.0,
+            'PROFILE_TOKEN': 'secret'})
+
+        res = app.test_client().get(
+            '/questions', headers={'X-Profile': 'secret'})
+
+        self.assertEqual(res.status_code, 200)
+        self.assertNotIn('profiling', app.extensions)
+        self.assertNotIn('X-Profile-Queries', res.headers)
+
+    def test_profile_wrong_sample_rate(self):
+        '''A sample rate outside 0.0 - 1.0 is rejected'''
+        with tempfile.TemporaryDirectory() as profile_dir:
+            with self.assertRaises(ValueError):
+                create_app({
+                    'PROFILE_DIR': profile_dir,
+                    'PROFILE_SAMPLE_RATE': '2'})
+
     def test_422_wrong_page_questions(self):
         '''Ask for a page wicth questions that doesn't exists'''
         res = self.client().get('/questions?page=100')